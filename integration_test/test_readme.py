@@ -3,13 +3,12 @@ import io
 import os
 import re
 
+# Regular expression pattern for finding Python code blocks
+SNIPPET_PATTERN = re.compile(r'```python(.*?)```', re.DOTALL)
 
-def extract_python_snippets(content):
-    # Regular expression pattern for finding Python code blocks
-    pattern = r'```python(.*?)```'
-    snippets = re.findall(pattern, content, re.DOTALL)
 
-    return snippets
+def extract_python_snippets(content):
+    return SNIPPET_PATTERN.findall(content)
 
 def evaluate_snippet(snippet):
     # Capture the output of the snippet
@@ -22,7 +21,8 @@ def evaluate_snippet(snippet):
 class TestReadme:
     def test_readme(self):
         readme_path = os.path.join(os.path.dirname(__file__), "..", "README.md")
-        readme_contents = open(readme_path, "r").read().strip()
+        with open(readme_path, "r", encoding="utf-8") as readme_file:
+            readme_contents = readme_file.read().strip()
         snippets = extract_python_snippets(readme_contents)
         for snippet in snippets:
             evaluate_snippet(snippet)
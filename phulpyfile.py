@@ -1,5 +1,5 @@
+import subprocess
 import xml.etree.ElementTree as ET
-from os import system, unlink
 from os.path import dirname, join
 
 from phulpy import task
@@ -14,21 +14,31 @@ def test(phulpy):
 def lint(phulpy):
     pydantic_mongo_dir = "pydantic_mongo"
     for cmd, message in (
-        (f"flake8 {pydantic_mongo_dir}", "please check flake8 errors"),
-        (f"isort {pydantic_mongo_dir} --profile black --check", "please run isort!"),
-        (f"black {pydantic_mongo_dir} --check", "please run black!"),
+        (["flake8", pydantic_mongo_dir], "please check flake8 errors"),
+        (
+            ["isort", pydantic_mongo_dir, "--profile", "black", "--check"],
+            "please run isort!",
+        ),
+        (["black", pydantic_mongo_dir, "--check"], "please run black!"),
     ):
-        result = system(cmd)
+        result = subprocess.run(cmd).returncode
         if result:
             raise Exception(f"Lint failed: {message}")
 
 
 @task
 def unit_test(phulpy):
-    result = system(
-        "pytest --cov-report term-missing"
-        + " --cov-report xml --cov=pydantic_mongo test"
-    )
+    result = subprocess.run(
+        [
+            "pytest",
+            "--cov-report",
+            "term-missing",
+            "--cov-report",
+            "xml",
+            "--cov=pydantic_mongo",
+            "test",
+        ]
+    ).returncode
     if result:
         raise Exception("Unit tests failed")
     coverage_path = join(dirname(__file__), "coverage.xml")
@@ -39,13 +49,15 @@ def unit_test(phulpy):
 
 @task
 def integration_test(phulpy):
-    result = system("pytest integration_test")
+    result = subprocess.run(["pytest", "integration_test"]).returncode
     if result:
         raise Exception("Integration tests failed")
 
 
 @task
 def typecheck(phulpy):
-    result = system('mypy pydantic_mongo test --check-untyped-defs')
+    result = subprocess.run(
+        ["mypy", "pydantic_mongo", "test", "--check-untyped-defs"]
+    ).returncode
     if result:
         raise Exception("lint test failed")
@@ -1,10 +1,42 @@
-from .abstract_repository import AbstractRepository
-from .fields import ObjectIdAnnotation, ObjectIdField, PydanticObjectId
+from importlib import import_module
+from typing import TYPE_CHECKING, Any, List
+
 from .version import __version__  # noqa: F401
 
+if TYPE_CHECKING:
+    from .abstract_repository import AbstractRepository
+    from .fields import ObjectIdAnnotation, ObjectIdField, PydanticObjectId
+
 __all__ = [
     "AbstractRepository",
     "ObjectIdField",
     "ObjectIdAnnotation",
     "PydanticObjectId",
 ]
+
+# Public names are resolved on first access so that importing the package
+# does not load pymongo and pydantic until they are actually needed.
+_LAZY_IMPORTS = {
+    "AbstractRepository": ".abstract_repository",
+    "ObjectIdField": ".fields",
+    "ObjectIdAnnotation": ".fields",
+    "PydanticObjectId": ".fields",
+}
+
+# Submodules stay reachable as attributes, as they were with eager imports
+_LAZY_SUBMODULES = ["abstract_repository", "errors", "fields", "pagination"]
+
+
+def __getattr__(name: str) -> Any:
+    if name in _LAZY_SUBMODULES:
+        # Importing the submodule also binds it on the package
+        return import_module(f".{name}", __name__)
+    if name not in _LAZY_IMPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(import_module(_LAZY_IMPORTS[name], __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__() -> List[str]:
+    return sorted(set(globals()) | set(_LAZY_IMPORTS) | set(_LAZY_SUBMODULES))
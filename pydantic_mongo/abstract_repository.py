@@ -1,8 +1,14 @@
+from functools import partial
+from itertools import islice
+from operator import attrgetter
 from typing import (
     Any,
+    Callable,
     Dict,
     Generic,
     Iterable,
+    Iterator,
+    List,
     Optional,
     Sequence,
     Tuple,
@@ -12,12 +18,15 @@ from typing import (
     cast,
 )
 
+from bson import ObjectId
 from pydantic import BaseModel
-from pymongo import UpdateOne
+from pymongo import InsertOne, UpdateOne
 from pymongo.collection import Collection
+from pymongo.cursor import Cursor
 from pymongo.database import Database
 from pymongo.results import InsertOneResult, UpdateResult
 
+from .errors import PaginationError
 from .pagination import (
     Edge,
     decode_pagination_cursor,
@@ -29,135 +38,249 @@ T = TypeVar("T", bound=BaseModel)
 OutputT = TypeVar("OutputT", bound=BaseModel)
 Sort = Sequence[Tuple[str, int]]
 
+# Upper bound for the number of documents fetched per round trip. Larger
+# batches mean fewer getMore calls but more documents held in memory.
+MAX_BATCH_SIZE = 1000
+
+_ID_FIELD_MAP = {"id": "_id"}
+_EXCLUDE_ID = {"id"}
+_get_id = attrgetter("id")
+
 
 class ModelWithId(BaseModel):
     id: Any
 
 
+def _map_document_id(document: dict, copy: bool = False) -> dict:
+    """
+    Rename the mongo _id key to id. Documents fresh from pymongo are ours and
+    are renamed in place, documents from callers need copy=True.
+    """
+    if "_id" in document:
+        if copy:
+            document = document.copy()
+        document["id"] = document.pop("_id")
+    return document
+
+
+def _document_loader(output_type: Type[OutputT]) -> Callable[[dict], OutputT]:
+    validate = output_type.model_validate
+
+    def load(document: dict) -> OutputT:
+        return validate(_map_document_id(document))
+
+    return load
+
+
+def _iter_models(cursor: Cursor, load: Callable[[dict], OutputT]) -> Iterator[OutputT]:
+    """
+    Convert cursor documents to models with load.
+    The cursor is closed as soon as iteration stops.
+    """
+    try:
+        for document in cursor:
+            yield load(document)
+    finally:
+        cursor.close()
+
+
+def _build_edges(
+    models: Iterable[OutputT], sort_keys: List[str]
+) -> List[Edge[OutputT]]:
+    """
+    Wrap models into pagination edges carrying the cursor for each model.
+    The nodes were just validated and the cursors are built here, so the
+    edges are constructed without validation.
+    """
+    edge_class: Type[Edge[OutputT]] = Edge[OutputT]
+    return [
+        edge_class.model_construct(
+            node=model,
+            cursor=encode_pagination_cursor(
+                get_pagination_cursor_payload(model, sort_keys)
+            ),
+        )
+        for model in models
+    ]
+
+
 class AbstractRepository(Generic[T]):
     class Meta:
         collection_name: str
 
+    __document_class: Type[T]
+    __collection_name: str
+    __to_model_overridden = False
+    __to_model_custom_overridden = False
+
+    def __init_subclass__(cls, **kwargs: Any):
+        """
+        Resolve the document class and collection name once per repository
+        class, so that creating a repository instance stays cheap
+        """
+        super().__init_subclass__(**kwargs)
+        cls.__document_class = (
+            getattr(cls.Meta, "document_class")
+            if hasattr(cls.Meta, "document_class")
+            else getattr(cls.__orig_bases__[0], "__args__", (None,))[0]  # type: ignore
+        )
+        cls.__collection_name = getattr(cls.Meta, "collection_name", "")
+        # Reads only go through the to_model hooks when they are overridden
+        cls.__to_model_overridden = cls.to_model is not AbstractRepository.to_model
+        cls.__to_model_custom_overridden = (
+            cls.to_model_custom is not AbstractRepository.to_model_custom
+        )
+
     def __init__(self, database: Database):
         super().__init__()
-        self.__database: Database = database
-        self.__document_class = (
-            getattr(self.Meta, "document_class")
-            if hasattr(self.Meta, "document_class")
-            else self.__orig_bases__[0].__args__[0]  # type: ignore
-        )
-        self.__collection_name = self.Meta.collection_name
         self.__validate()
+        self.__collection: Collection = database[self.__collection_name]
+        self.__model_validate = self.__document_class.model_validate
 
     """
     Get pymongo collection
     """
 
     def get_collection(self) -> Collection:
-        return self.__database[self.__collection_name]
+        return self.__collection
 
     def __validate(self):
-        if "id" not in self.__document_class.model_fields:
+        if "id" not in getattr(self.__document_class, "model_fields", {}):
             raise Exception("Document class should have id field")
         if not self.__collection_name:
             raise Exception("Meta should contain collection name")
 
     @staticmethod
-    def to_document(model: T) -> dict:
+    def to_document(model: T, partial: bool = False) -> dict:
         """
         Convert model to document
         :param model:
+        :param partial: only include the fields set on the model, either at
+            construction or by assignment
         :return: dict
         """
-        model_with_id = cast(ModelWithId, model)
-        data = model_with_id.model_dump()
-        data.pop("id")
-        if model_with_id.id:
-            data["_id"] = model_with_id.id
+        data = model.model_dump(
+            include=model.model_fields_set if partial else None, exclude=_EXCLUDE_ID
+        )
+        mongo_id = _get_id(model)
+        if mongo_id:
+            data["_id"] = mongo_id
         return data
 
     def __map_id(self, data: dict) -> dict:
-        query = data.copy()
-        if "id" in data:
-            query["_id"] = query.pop("id")
-        return query
-
-    def __map_sort(self, sort: Sort) -> Optional[Sort]:
-        result = []
-        for item in sort:
-            key = item[0]
-            ordering = item[1]
-            if key == "id":
-                key = "_id"
-            result.append((key, ordering))
-        return result
+        if "id" not in data:
+            return data
+        return {_ID_FIELD_MAP.get(key, key): value for key, value in data.items()}
+
+    @staticmethod
+    def __map_sort(sort: Sort) -> Sort:
+        if not any(key == "id" for key, _ in sort):
+            return sort
+        return [(_ID_FIELD_MAP.get(key, key), ordering) for key, ordering in sort]
 
     def to_model_custom(self, output_type: Type[OutputT], data: dict) -> OutputT:
         """
         Convert document to model with custom output type
+
+        When overridden, find_by_with_output_type and find_by load documents
+        through it, as do find_one_by and find_one_by_id unless to_model is
+        overridden too.
         """
-        data_copy = data.copy()
-        if "_id" in data_copy:
-            data_copy["id"] = data_copy.pop("_id")
-        return output_type.model_validate(data_copy)
+        return output_type.model_validate(_map_document_id(data, copy=True))
 
     def to_model(self, data: dict) -> T:
         """
         Convert document to model
+
+        When overridden, find_one_by and find_one_by_id load documents
+        through it.
         """
-        return self.to_model_custom(self.__document_class, data)
+        return self.__model_validate(_map_document_id(data, copy=True))
 
-    def save(self, model: T) -> Union[InsertOneResult, UpdateResult]:
+    def save(
+        self, model: T, partial: bool = False
+    ) -> Union[InsertOneResult, UpdateResult]:
         """
         Save entity to database. It will update the entity if it has id, otherwise it will insert it.
-        """
-        document = self.to_document(model)
-        model_with_id = cast(ModelWithId, model)
 
-        if model_with_id.id:
+        With partial, updates only $set the fields in model.model_fields_set
+        and raise ValueError if no field besides id is set. Inserts always
+        write the whole model. Models loaded through find_* or to_model have
+        every stored field set, so partial only reduces the write for models
+        built from a subset of fields.
+        """
+        if _get_id(model):
+            document = self.__to_update_document(model, partial)
             mongo_id = document.pop("_id")
             return self.get_collection().update_one(
                 {"_id": mongo_id}, {"$set": document}, upsert=True
             )
 
-        result = self.get_collection().insert_one(document)
-        model_with_id.id = result.inserted_id
+        result = self.get_collection().insert_one(self.to_document(model))
+        cast(ModelWithId, model).id = result.inserted_id
         return result
 
-    def save_many(self, models: Iterable[T]):
+    def __to_update_document(self, model: T, partial: bool) -> dict:
+        # to_document only gets the flag when asked for, so subclasses that
+        # override it with the one argument signature keep working
+        if not partial:
+            return self.to_document(model)
+
+        document = self.to_document(model, partial=True)
+        if len(document) == 1:
+            # An empty $set is rejected by MongoDB before 5.0
+            raise ValueError("Partial save requires fields other than id to be set")
+        return document
+
+    def save_many(
+        self, models: Iterable[T], chunk_size: int = 1000, partial: bool = False
+    ):
         """
         Save multiple entities to database
+
+        Models are written in chunks of chunk_size operations, trading one
+        round trip per chunk for bounded client memory on large iterables.
+        The partial flag behaves as in save, so it only reduces the write
+        for models built from a subset of fields.
         """
-        models_to_insert = []
-        models_to_update = []
-
-        for model in models:
-            model_with_id = cast(ModelWithId, model)
-            if model_with_id.id:
-                models_to_update.append(model)
-            else:
-                models_to_insert.append(model)
-        if len(models_to_insert) > 0:
-            result = self.get_collection().insert_many(
-                (self.to_document(model) for model in models_to_insert)
-            )
+        if chunk_size < 1:
+            raise ValueError("chunk_size must be at least 1")
+
+        collection = self.get_collection()
+        models_iterator = iter(models)
 
-            for idx, inserted_id in enumerate(result.inserted_ids):
-                cast(ModelWithId, models_to_insert[idx]).id = inserted_id
+        while True:
+            chunk = list(islice(models_iterator, chunk_size))
 
-        if len(models_to_update) == 0:
-            return
+            if len(chunk) == 0:
+                return
 
-        documents_to_update = [self.to_document(model) for model in models_to_update]
-        mongo_ids = [doc.pop("_id") for doc in documents_to_update]
-        bulk_operations = [
-            UpdateOne({"_id": mongo_id}, {"$set": document}, upsert=True)
-            for mongo_id, document in zip(mongo_ids, documents_to_update)
-        ]
-        self.get_collection().bulk_write(bulk_operations)
+            if len(chunk) == 1:
+                # A single write is cheaper than setting up a bulk operation
+                self.save(chunk[0], partial)
+                continue
+
+            bulk_operations: List[Union[InsertOne, UpdateOne]] = []
+
+            for model in chunk:
+                if _get_id(model):
+                    document = self.__to_update_document(model, partial)
+                    mongo_id = document.pop("_id")
+                    bulk_operations.append(
+                        UpdateOne({"_id": mongo_id}, {"$set": document}, upsert=True)
+                    )
+                else:
+                    document = self.to_document(model)
+                    # Same id pymongo would generate, assigned up front so no
+                    # second pass over the inserted models is needed
+                    mongo_id = document["_id"] = ObjectId()
+                    cast(ModelWithId, model).id = mongo_id
+                    bulk_operations.append(InsertOne(document))
+
+            collection.bulk_write(bulk_operations, ordered=False)
 
     def delete(self, model: T):
-        return self.get_collection().delete_one({"_id": cast(ModelWithId, model).id})
+        return self.get_collection().delete_one({"_id": _get_id(model)})
 
     def delete_by_id(self, _id: Any):
         return self.get_collection().delete_one({"_id": _id})
@@ -168,14 +291,23 @@ class AbstractRepository(Generic[T]):
 
         Note: The id should be of the same type as the id field in the document class, ie. ObjectId
         """
-        return self.find_one_by({"id": _id})
+        return self.__load_model(self.get_collection().find_one({"_id": _id}))
 
     def find_one_by(self, query: dict) -> Optional[T]:
         """
         Find entity by mongo query
         """
-        result = self.get_collection().find_one(self.__map_id(query))
-        return self.to_model(result) if result else None
+        return self.__load_model(self.get_collection().find_one(self.__map_id(query)))
+
+    def __load_model(self, document: Optional[dict]) -> Optional[T]:
+        if not document:
+            return None
+        if self.__to_model_overridden:
+            return self.to_model(document)
+        if self.__to_model_custom_overridden:
+            return self.to_model_custom(self.__document_class, document)
+        # The document returned by pymongo is ours, so rename in place
+        return self.__model_validate(_map_document_id(document))
 
     def find_by_with_output_type(
         self,
@@ -185,6 +317,7 @@ class AbstractRepository(Generic[T]):
         limit: Optional[int] = None,
         sort: Optional[Sort] = None,
         projection: Optional[Dict[str, int]] = None,
+        batch_size: Optional[int] = None,
     ) -> Iterable[OutputT]:
         """
         Find entities by mongo query allowing custom output type
@@ -194,18 +327,25 @@ class AbstractRepository(Generic[T]):
         :param limit:
         :param sort:
         :param projection:
+        :param batch_size: number of documents fetched per round trip, defaults
+            to the limit capped at MAX_BATCH_SIZE
         :return:
         """
-        mapped_projection = self.__map_id(projection) if projection else None
-        mapped_sort = self.__map_sort(sort) if sort else None
-        cursor = self.get_collection().find(self.__map_id(query), mapped_projection)
-        if limit:
-            cursor.limit(limit)
-        if skip:
-            cursor.skip(skip)
-        if mapped_sort:
-            cursor.sort(mapped_sort)
-        return map(lambda doc: self.to_model_custom(output_type, doc), cursor)
+        cursor = self.get_collection().find(
+            self.__map_id(query),
+            self.__map_id(projection) if projection else None,
+            skip=skip or 0,
+            limit=limit or 0,
+            sort=self.__map_sort(sort) if sort else None,
+            # A negative limit asks for a single batch of abs(limit) documents
+            batch_size=batch_size or min(abs(limit or MAX_BATCH_SIZE), MAX_BATCH_SIZE),
+        )
+        load = (
+            partial(self.to_model_custom, output_type)
+            if self.__to_model_custom_overridden
+            else _document_loader(output_type)
+        )
+        return _iter_models(cursor, load)
 
     def find_by(
         self,
@@ -214,6 +354,7 @@ class AbstractRepository(Generic[T]):
         limit: Optional[int] = None,
         sort: Optional[Sort] = None,
         projection: Optional[Dict[str, int]] = None,
+        batch_size: Optional[int] = None,
     ) -> Iterable[T]:
         """ "
         Find entities by mongo query
@@ -225,6 +366,7 @@ class AbstractRepository(Generic[T]):
             limit=limit,
             sort=sort,
             projection=projection,
+            batch_size=batch_size,
         )
 
     def get_pagination_query(
@@ -237,26 +379,31 @@ class AbstractRepository(Generic[T]):
         """
         Build pagination query based on the cursor and sort
         """
-        generated_query: dict = {"$and": [query]}
         selected_cursor = after or before
 
-        if selected_cursor and sort:
-            cursor_data = decode_pagination_cursor(selected_cursor)
-            dict_values = []
-            for i, sort_expression in enumerate(sort):
-                if after:
-                    compare_operator = "$gt" if sort_expression[1] > 0 else "$lt"
-                else:
-                    compare_operator = "$lt" if sort_expression[1] > 0 else "$gt"
-                dict_values.append(
-                    (sort_expression[0], {compare_operator: cursor_data[i]})
-                )
-            generated_query["$and"].append(dict(dict_values))
+        if not (selected_cursor and sort):
+            return query or {}
+
+        cursor_data = decode_pagination_cursor(selected_cursor)
+        # A cursor built for another sort would silently drop range predicates
+        if len(cursor_data) != len(sort):
+            raise PaginationError("Invalid cursor")
+        ascending_operator, descending_operator = (
+            ("$gt", "$lt") if after else ("$lt", "$gt")
+        )
+        cursor_query = {}
+        for (key, direction), value in zip(sort, cursor_data):
+            operator = ascending_operator if direction > 0 else descending_operator
+            cursor_query[_ID_FIELD_MAP.get(key, key)] = {operator: value}
 
-        if len(generated_query["$and"]) == 1:
-            generated_query = query or {}
+        # Compare keys after renaming id, so a query on id can't replace the
+        # cursor range on _id. Keep the range first and avoid $and when the
+        # keys don't clash.
+        query = self.__map_id(query or {})
+        if query.keys().isdisjoint(cursor_query):
+            return {**cursor_query, **query}
 
-        return generated_query
+        return {"$and": [cursor_query, query]}
 
     def paginate_with_output_type(
         self,
@@ -267,17 +414,15 @@ class AbstractRepository(Generic[T]):
         before: Optional[str] = None,
         sort: Optional[Sort] = None,
         projection: Optional[Dict[str, int]] = None,
-    ) -> Iterable[Edge[OutputT]]:
+        batch_size: Optional[int] = None,
+    ) -> List[Edge[OutputT]]:
         """
         Paginate entities by mongo query allowing custom output type
         """
-        sort_keys = []
-
         if not sort:
             sort = [("_id", 1)]
 
-        for sort_expression in sort:
-            sort_keys.append(sort_expression[0])
+        sort_keys = [key for key, _ in sort]
 
         models = self.find_by_with_output_type(
             output_type,
@@ -287,17 +432,10 @@ class AbstractRepository(Generic[T]):
             limit=limit,
             sort=sort,
             projection=projection,
+            batch_size=batch_size,
         )
 
-        return map(
-            lambda model: Edge[OutputT](
-                node=model,
-                cursor=encode_pagination_cursor(
-                    get_pagination_cursor_payload(model, sort_keys)
-                ),
-            ),
-            models,
-        )
+        return _build_edges(models, sort_keys)
 
     def paginate(
         self,
@@ -307,11 +445,12 @@ class AbstractRepository(Generic[T]):
         before: Optional[str] = None,
         sort: Optional[Sort] = None,
         projection: Optional[Dict[str, int]] = None,
-    ) -> Iterable[Edge[T]]:
+        batch_size: Optional[int] = None,
+    ) -> List[Edge[T]]:
         """
         Paginate entities by mongo query using cursor based pagination
 
-        Return type is an iterable of Edge objects, which contain the model and the cursor
+        Return type is a list of Edge objects, which contain the model and the cursor
         """
         return self.paginate_with_output_type(
             self.__document_class,
@@ -321,4 +460,5 @@ class AbstractRepository(Generic[T]):
             before=before,
             sort=sort,
             projection=projection,
+            batch_size=batch_size,
         )
@@ -1,37 +1,59 @@
+import re
 from typing import Any
 
 from bson import ObjectId
 from pydantic_core import core_schema
 from typing_extensions import Annotated
 
+# Checking the hex form up front is cheaper than letting ObjectId() fail
+_match_object_id_hex = re.compile(r"\A[0-9a-fA-F]{24}\Z").match
+
 
 class ObjectIdAnnotation:
     @classmethod
     def __get_pydantic_core_schema__(
         cls, _source_type: Any, _handler: Any
     ) -> core_schema.CoreSchema:
-        object_id_schema = core_schema.chain_schema(
-            [
-                core_schema.str_schema(),
-                core_schema.no_info_plain_validator_function(cls.validate),
-            ]
-        )
-        return core_schema.json_or_python_schema(
-            json_schema=core_schema.str_schema(),
-            python_schema=core_schema.union_schema(
-                [core_schema.is_instance_schema(ObjectId), object_id_schema]
-            ),
-            serialization=core_schema.plain_serializer_function_ser_schema(
-                lambda x: str(x)
-            ),
-        )
+        return _OBJECT_ID_CORE_SCHEMA
 
     @classmethod
     def validate(cls, value):
-        if not ObjectId.is_valid(value):
-            raise ValueError("Invalid id")
+        # Kept for callers outside pydantic, same rules as the field schema
+        return _validate_object_id(value)
+
+
+def _validate_object_id(value: Any) -> ObjectId:
+    # Ids loaded by pymongo are exactly ObjectId and ids from requests are
+    # exactly str, so those are dispatched on type before any isinstance
+    value_type = type(value)
+    if value_type is ObjectId:
+        return value
+    if value_type is str:
+        if _match_object_id_hex(value):
+            return ObjectId(value)
+        raise ValueError("Invalid id")
 
+    if isinstance(value, ObjectId):
+        return value
+    # Same inputs the former str_schema step accepted
+    if isinstance(value, (bytes, bytearray)):
+        try:
+            value = value.decode()
+        except UnicodeDecodeError:
+            raise ValueError("Invalid id")
+    if isinstance(value, str) and _match_object_id_hex(value):
         return ObjectId(value)
+    raise ValueError("Invalid id")
+
+
+# The schema doesn't depend on the annotated type, so it is built only once.
+# A single plain validator replaces the union of an instance check and a
+# str/validate chain, saving pydantic-core a dispatch per field.
+_OBJECT_ID_CORE_SCHEMA = core_schema.json_or_python_schema(
+    json_schema=core_schema.str_schema(),
+    python_schema=core_schema.no_info_plain_validator_function(_validate_object_id),
+    serialization=core_schema.plain_serializer_function_ser_schema(lambda x: str(x)),
+)
 
 
 # Deprecated, use PydanticObjectId instead.
@@ -1,6 +1,7 @@
 import zlib
-from base64 import b64decode, b64encode
-from typing import Any, Generic, List, TypeVar
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from functools import lru_cache
+from typing import Any, Generic, List, Optional, Tuple, TypeVar
 
 import bson
 from pydantic import BaseModel
@@ -17,38 +18,67 @@ class Edge(BaseModel, Generic[DataT]):
 
 def encode_pagination_cursor(data: List) -> str:
     byte_data: bytes = bson.BSON.encode({"v": data})
-    byte_data = zlib.compress(byte_data, 9)
-    return b64encode(byte_data).decode("utf-8")
+    # Cursors are a few dozen bytes, level 9 costs time without saving space
+    byte_data = zlib.compress(byte_data, 1)
+    # URL safe alphabet without padding, so cursors can go in query strings
+    return urlsafe_b64encode(byte_data).rstrip(b"=").decode("ascii")
 
 
 def decode_pagination_cursor(data: str) -> List:
+    return list(__decode_pagination_cursor(data))
+
+
+@lru_cache(maxsize=256)
+def __decode_pagination_cursor(data: str) -> Tuple:
     try:
-        byte_data = b64decode(data.encode("utf-8"))
+        # Also decodes padded cursors in the standard alphabet, which older
+        # versions produced: "+" and "/" are kept as they are
+        byte_data = urlsafe_b64decode(data + "=" * (-len(data) % 4))
         byte_data = zlib.decompress(byte_data)
         result = bson.BSON(byte_data).decode()
-        return result["v"]
+        return tuple(result["v"])
     except Exception:
         raise PaginationError("Invalid cursor")
 
 
 def get_pagination_cursor_payload(model: BaseModel, keys: List[str]) -> List[Any]:
-    model_dict = model.model_dump()
-    model_dict["_id"] = model_dict["id"]
+    # Values must match what to_document stores: the id as is, every other
+    # field in its dumped form. Only the fields used by the sort are dumped.
+    fields = {__compile_path(key)[0][0] for key in keys} - {"_id", "id"}
+    model_dict = model.model_dump(include=fields) if fields else {}
+    model_dict["_id"] = model_dict["id"] = getattr(model, "id", None)
 
     return [__evaluate_dot_notation(model_dict, key) for key in keys]
 
 
+@lru_cache(maxsize=256)
+def __compile_path(path: str) -> Tuple[Tuple[str, Any], ...]:
+    """
+    Split a dot notation path into (piece, index) steps, with list indexes
+    converted once (None when the piece isn't an int). Sort keys are usually
+    static, so this is cached.
+    """
+    steps = []
+    for piece in path.split("."):
+        try:
+            index: Optional[int] = int(piece)
+        except ValueError:
+            index = None
+        steps.append((piece, index))
+    return tuple(steps)
+
+
 def __evaluate_dot_notation(data: Any, path: str):
-    pieces = path.split(".")
+    steps = __compile_path(path)
 
-    if len(pieces) == 1:
+    if len(steps) == 1:
         return data[path]
 
     current_data = data
 
-    for piece in pieces:
+    for piece, index in steps:
         if isinstance(current_data, list) or isinstance(current_data, tuple):
-            current_data = current_data[int(piece)]
+            current_data = current_data[index]
         else:
             current_data = current_data[piece]
 
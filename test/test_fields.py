@@ -4,6 +4,7 @@ from bson import ObjectId
 from pydantic import BaseModel, ValidationError
 
 from pydantic_mongo import ObjectIdField
+from pydantic_mongo.fields import ObjectIdAnnotation
 
 
 class User(BaseModel):
@@ -16,6 +17,31 @@ class TestFields:
             User.model_validate({"id": "lala"})
         User.model_validate({"id": "611827f2878b88b49ebb69fc"})
 
+    def test_object_id_validation_input_types(self):
+        object_id = ObjectId("611827f2878b88b49ebb69fc")
+        assert object_id is User(id=object_id).id
+        assert object_id == User.model_validate({"id": b"611827f2878b88b49ebb69fc"}).id
+        object_id_field = ObjectIdField("611827f2878b88b49ebb69fc")
+        assert object_id_field is User(id=object_id_field).id
+
+        class HexString(str):
+            pass
+
+        hex_string = HexString("611827f2878b88b49ebb69fc")
+        assert object_id == User.model_validate({"id": hex_string}).id
+        for value in [None, 1, b"\xff", b"abcdefghijkl"]:
+            with pytest.raises(ValidationError):
+                User.model_validate({"id": value})
+
+    def test_object_id_validate(self):
+        object_id = ObjectId("611827f2878b88b49ebb69fc")
+        assert object_id is ObjectIdAnnotation.validate(object_id)
+        assert object_id == ObjectIdAnnotation.validate("611827f2878b88b49ebb69fc")
+        assert object_id == ObjectIdAnnotation.validate(b"611827f2878b88b49ebb69fc")
+        for value in [None, "lala", b"lala", b"abcdefghijkl", object_id.binary, 1]:
+            with pytest.raises(ValueError):
+                ObjectIdAnnotation.validate(value)
+
     def test_object_id_serialize(self):
         lala = User(id=ObjectId("611827f2878b88b49ebb69fc"))
         json_result = lala.model_dump_json()
@@ -0,0 +1,26 @@
+import subprocess
+import sys
+
+import pytest
+
+import pydantic_mongo
+from pydantic_mongo.abstract_repository import AbstractRepository
+
+
+class TestInit:
+    def test_lazy_export(self):
+        assert pydantic_mongo.AbstractRepository is AbstractRepository
+        assert "PydanticObjectId" in dir(pydantic_mongo)
+
+    def test_unknown_attribute(self):
+        with pytest.raises(AttributeError):
+            pydantic_mongo.missing_attribute
+
+    def test_lazy_submodules(self):
+        assert "errors" in dir(pydantic_mongo)
+        code = (
+            "import pydantic_mongo; "
+            "assert pydantic_mongo.errors.PaginationError; "
+            "assert pydantic_mongo.pagination.Edge"
+        )
+        subprocess.run([sys.executable, "-c", code], check=True)
@@ -1,8 +1,9 @@
-from typing import List, Optional
+from typing import Dict, List, Optional
 
 from bson import ObjectId
 from pydantic import BaseModel
 
+from pydantic_mongo import pagination
 from pydantic_mongo.pagination import (
     decode_pagination_cursor,
     encode_pagination_cursor,
@@ -24,6 +25,7 @@ class Spam(BaseModel):
     id: Optional[str] = None
     foo: Foo
     bars: List[Bar]
+    tags: Dict[str, int] = {}
 
 
 class TestPagination:
@@ -40,8 +42,56 @@ class TestPagination:
         values = get_pagination_cursor_payload(spam, ["bars.0.apple"])
         assert values[0] == "x"
 
+    def test_get_pagination_cursor_payload_single_key(self):
+        spam = Spam(id="lala", foo=Foo(count=1, size=1.0), bars=[Bar()])
+
+        values = get_pagination_cursor_payload(spam, ["_id"])
+        assert values == ["lala"]
+
+        values = get_pagination_cursor_payload(spam, ["foo"])
+        assert values == [{"count": 1, "size": 1.0}]
+
+    def test_get_pagination_cursor_payload_attributes(self):
+        spam = Spam(id="lala", foo=Foo(count=1, size=1.0), bars=[Bar()], tags={"a": 2})
+
+        values = get_pagination_cursor_payload(spam, ["tags.a", "bars.0.banana"])
+        assert values == [2, "y"]
+
+        values = get_pagination_cursor_payload(spam, ["bars", "bars.0", "foo.count"])
+        assert values == [
+            [{"apple": "x", "banana": "y"}],
+            {"apple": "x", "banana": "y"},
+            1,
+        ]
+
     def test_cursor_encoding(self):
         old_value = [ObjectId("611b158adec89d18984b7d90"), "a", 1]
         cursor = encode_pagination_cursor(old_value)
         new_value = decode_pagination_cursor(cursor)
         assert old_value == new_value
+
+    def test_cursor_encoding_url_safe(self):
+        value = [ObjectId("611b158adec89d18984b7d90"), "a" * 100, 1]
+        cursor = encode_pagination_cursor(value)
+        assert not set(cursor) & set("+/=")
+        assert value == decode_pagination_cursor(cursor)
+
+    def test_cursor_decoding_legacy_format(self):
+        # Standard alphabet with padding, as encoded by previous versions
+        cursor = "eNqTY2BgYCljEANSTAYMzEAqMZFBwJDBgwEEACG/Ai8="
+        assert ["aa", 72] == decode_pagination_cursor(cursor)
+
+    def test_cursor_decoding_cache(self):
+        # getattr avoids name mangling of the module private function
+        cached_decode = getattr(pagination, "__decode_pagination_cursor")
+        cursor = encode_pagination_cursor([ObjectId("611b158adec89d18984b7d90"), 1])
+
+        first_value = decode_pagination_cursor(cursor)
+        hits = cached_decode.cache_info().hits
+        first_value.append("mutated")
+
+        assert [
+            ObjectId("611b158adec89d18984b7d90"),
+            1,
+        ] == decode_pagination_cursor(cursor)
+        assert hits + 1 == cached_decode.cache_info().hits
@@ -6,8 +6,21 @@ from bson import ObjectId
 from pydantic import BaseModel, Field
 
 from pydantic_mongo import AbstractRepository, PydanticObjectId
+from pydantic_mongo.abstract_repository import MAX_BATCH_SIZE
 from pydantic_mongo.errors import PaginationError
 
+SPAM_ID = ObjectId("611827f2878b88b49ebb69fc")
+UPSERTED_SPAM_ID = ObjectId("65012da68ea5a4798502f710")
+PAGINATED_SPAM_IDS = [
+    ObjectId("611b140f4eb6ee47e966860f"),
+    ObjectId("611b141cf533ca420b7580d6"),
+    ObjectId("611b15241dea2ee3f7cbfe30"),
+    ObjectId("611b157c859bde7de88c98ac"),
+    ObjectId("611b158adec89d18984b7d90"),
+]
+# Cursor pointing at the last paginated spam when sorting by _id
+PAGINATION_CURSOR = "eNqTYWBgYCljEAFS7AYMidKiXfdOzJWY4V07gYEBAD7HBkg="
+
 
 class Foo(BaseModel):
     count: int
@@ -30,38 +43,77 @@ class SpamRepository(AbstractRepository[Spam]):
         collection_name = "spams"
 
 
+class Ham(BaseModel):
+    id: Optional[PydanticObjectId] = None
+    owner: PydanticObjectId
+    position: int
+
+
+class HamRepository(AbstractRepository[Ham]):
+    class Meta:
+        collection_name = "hams"
+
+
+class NoIdModel(BaseModel):
+    something: str
+
+
+class NoIdRepository(AbstractRepository[NoIdModel]):
+    class Meta:
+        collection_name = "spams"
+
+
+class NoCollectionNameRepository(AbstractRepository[Spam]):
+    class Meta:
+        collection_name = None
+
+
+@pytest.fixture(scope="session")
+def client():
+    return mongomock.MongoClient()
+
+
 @pytest.fixture
-def database():
-    return mongomock.MongoClient().db
+def database(client):
+    client.drop_database("db")
+    return client.db
+
+
+@pytest.fixture
+def spam_repository(database):
+    return SpamRepository(database=database)
+
+
+@pytest.fixture
+def sample_spam():
+    # Trusted literal data, so validation is skipped
+    return Spam.model_construct(
+        foo=Foo.model_construct(count=1, size=1.0), bars=[Bar.model_construct()]
+    )
 
 
 class TestRepository:
-    def test_save(self, database):
-        spam_repository = SpamRepository(database=database)
-        foo = Foo(count=1, size=1.0)
-        bar = Bar()
-        spam = Spam(foo=foo, bars=[bar])
-        spam_repository.save(spam)
+    def test_save(self, database, spam_repository, sample_spam):
+        spam_repository.save(sample_spam)
 
         assert {
-            "_id": ObjectId(spam.id),
+            "_id": ObjectId(sample_spam.id),
             "foo": {"count": 1, "size": 1.0},
             "bars": [{"apple": "x", "banana": "y"}],
         } == database["spams"].find()[0]
 
-        cast(Foo, spam.foo).count = 2
-        spam_repository.save(spam)
+        cast(Foo, sample_spam.foo).count = 2
+        spam_repository.save(sample_spam)
 
         assert {
-            "_id": ObjectId(spam.id),
+            "_id": ObjectId(sample_spam.id),
             "foo": {"count": 2, "size": 1.0},
             "bars": [{"apple": "x", "banana": "y"}],
         } == database["spams"].find()[0]
 
-    def test_save_upsert(self, database):
-        spam_repository = SpamRepository(database=database)
+    def test_save_upsert(self, database, spam_repository):
         spam = Spam(
-            id=ObjectId("65012da68ea5a4798502f710"),
+            id=UPSERTED_SPAM_ID,
             foo=Foo(count=1, size=1.0),
             bars=[]
         )
@@ -73,11 +125,10 @@ class TestRepository:
             "bars": [],
         } == database["spams"].find()[0]
 
-    def test_save_many(self, database):
-        spam_repository = SpamRepository(database=database)
+    def test_save_many(self, database, spam_repository):
         spams = [
             Spam(),
-            Spam(id=ObjectId("65012da68ea5a4798502f710")),
+            Spam(id=UPSERTED_SPAM_ID),
         ]
         spam_repository.save_many(spams)
 
@@ -106,54 +157,145 @@ class TestRepository:
         assert new_span.id is not None
         assert 3 == database["spams"].count_documents({})
 
-    def test_delete(self, database):
-        spam_repository = SpamRepository(database=database)
-        foo = Foo(count=1, size=1.0)
-        bar = Bar()
-        spam = Spam(foo=foo, bars=[bar])
+    def test_save_many_single_bulk_write(self, database, spam_repository, mocker):
+        bulk_write_spy = mocker.spy(spam_repository.get_collection(), "bulk_write")
+        spams = [Spam(), Spam(id=UPSERTED_SPAM_ID), Spam()]
+        spam_repository.save_many(spams)
+
+        assert 1 == bulk_write_spy.call_count
+        assert 3 == database["spams"].count_documents({})
+
+    def test_save_many_in_chunks(self, database, spam_repository):
+        spams = [Spam(), Spam(id=UPSERTED_SPAM_ID), Spam()]
+        spam_repository.save_many(spams, chunk_size=2)
+
+        assert all(spam.id is not None for spam in spams)
+        assert 3 == database["spams"].count_documents({})
+
+    @pytest.mark.parametrize("chunk_size", [0, -1])
+    def test_save_many_invalid_chunk_size(self, database, spam_repository, chunk_size):
+        spams = [Spam(), Spam()]
+        with pytest.raises(ValueError):
+            spam_repository.save_many(spams, chunk_size=chunk_size)
+
+        assert all(spam.id is None for spam in spams)
+        assert 0 == database["spams"].count_documents({})
+
+    def test_save_many_empty(self, database, spam_repository):
+        spam_repository.save_many([])
+        assert 0 == database["spams"].count_documents({})
+
+    def test_save_partial(self, database, spam_repository):
+        spam = Spam(foo=Foo(count=1, size=1.0), bars=[Bar()])
         spam_repository.save(spam)
 
-        result = spam_repository.find_one_by_id(spam.id)
-        assert result is not None
+        spam_repository.save(Spam(id=spam.id, bars=[]), partial=True)
 
-        spam_repository.delete(spam)
-        result = spam_repository.find_one_by_id(spam.id)
-        assert result is None
+        assert {
+            "_id": ObjectId(spam.id),
+            "foo": {"count": 1, "size": 1.0},
+            "bars": [],
+        } == database["spams"].find()[0]
 
-    def test_delete_by_id(self, database):
-        spam_repository = SpamRepository(database=database)
-        foo = Foo(count=1, size=1.0)
-        bar = Bar()
-        spam = Spam(foo=foo, bars=[bar])
+    def test_save_partial_loaded_model(self, database, spam_repository):
+        spam = Spam(foo=Foo(count=1), bars=[Bar()])
         spam_repository.save(spam)
+        loaded = spam_repository.find_one_by_id(spam.id)
+        database["spams"].update_one({"_id": spam.id}, {"$set": {"foo.count": 2}})
 
-        result = spam_repository.find_one_by_id(spam.id)
-        assert result is not None
+        # Every stored field counts as set on a loaded model, so all of them
+        # are written back, not only the mutated one
+        loaded.bars = []
+        spam_repository.save(loaded, partial=True)
+
+        assert {
+            "_id": ObjectId(spam.id),
+            "foo": {"count": 1, "size": None},
+            "bars": [],
+        } == database["spams"].find()[0]
+
+    def test_save_partial_without_fields(self, spam_repository):
+        with pytest.raises(ValueError):
+            spam_repository.save(Spam(id=UPSERTED_SPAM_ID), partial=True)
+
+    def test_save_with_to_document_override(self, database):
+        class LegacySpamRepository(SpamRepository):
+            @staticmethod
+            def to_document(model):  # type: ignore[override]
+                return AbstractRepository.to_document(model)
+
+        spam_repository = LegacySpamRepository(database=database)
+        spams = [Spam(id=UPSERTED_SPAM_ID), Spam(id=SPAM_ID)]
+        spam_repository.save(spams[0])
+        spam_repository.save_many(spams)
+
+        assert 2 == database["spams"].count_documents({})
+
+    def test_save_many_partial(self, database, spam_repository):
+        spams = [Spam(foo=Foo(count=1)), Spam(foo=Foo(count=2))]
+        spam_repository.save_many(spams)
+
+        updates = [Spam(id=spam.id) for spam in spams]
+        for update in updates:
+            update.bars = []
+        spam_repository.save_many(updates, partial=True)
+
+        assert [
+            {
+                "_id": ObjectId(spams[0].id),
+                "foo": {"count": 1, "size": None},
+                "bars": [],
+            },
+            {
+                "_id": ObjectId(spams[1].id),
+                "foo": {"count": 2, "size": None},
+                "bars": [],
+            },
+        ] == list(database["spams"].find())
+
+    def test_delete(self, database, spam_repository, sample_spam):
+        spam_repository.save(sample_spam)
+
+        assert 1 == database["spams"].count_documents({"_id": sample_spam.id}, limit=1)
 
-        spam_repository.delete_by_id(spam.id)
-        result = spam_repository.find_one_by_id(spam.id)
-        assert result is None
+        spam_repository.delete(sample_spam)
+        assert 0 == database["spams"].count_documents({"_id": sample_spam.id}, limit=1)
 
-    def test_find_by_id(self, database):
-        spam_id = ObjectId("611827f2878b88b49ebb69fc")
+    def test_delete_by_id(self, database, spam_repository, sample_spam):
+        spam_repository.save(sample_spam)
+
+        assert 1 == database["spams"].count_documents({"_id": sample_spam.id}, limit=1)
+
+        spam_repository.delete_by_id(sample_spam.id)
+        assert 0 == database["spams"].count_documents({"_id": sample_spam.id}, limit=1)
+
+    def test_find_by_id(self, database, spam_repository):
         database.spams.insert_one(
             {
-                "_id": spam_id,
+                "_id": SPAM_ID,
                 "foo": {"count": 2, "size": 1.0},
                 "bars": [{"apple": "x", "banana": "y"}],
             }
         )
 
-        spam_repository = SpamRepository(database=database)
-        result = spam_repository.find_one_by_id(spam_id)
+        result = spam_repository.find_one_by_id(SPAM_ID)
 
         assert result is not None
         assert result.bars is not None
         assert issubclass(Spam, type(result))
-        assert spam_id == result.id
+        assert SPAM_ID == result.id
         assert "x" == result.bars[0].apple
 
-    def test_find_by(self, database):
+    def test_find_one_by(self, database, spam_repository):
+        database.spams.insert_one({"_id": SPAM_ID, "foo": {"count": 2}})
+
+        result = spam_repository.find_one_by({"id": SPAM_ID})
+        assert result is not None
+        assert SPAM_ID == result.id
+
+        assert spam_repository.find_one_by({"foo.count": 3}) is None
+
+    def test_find_by(self, database, spam_repository):
         database.spams.insert_many(
             [
                 {
@@ -164,14 +306,13 @@ class TestRepository:
                     "foo": {"count": 3, "size": 1.0},
                     "bars": [{"apple": "x", "banana": "y"}],
                 },
-            ]
+            ],
+            ordered=False,
         )
 
-        spam_repository = SpamRepository(database=database)
-
-        # Simple Find
-        result = spam_repository.find_by({})
-        results = [x for x in result]
+        # Simple Find, sorted since unordered inserts don't fix natural order
+        result = spam_repository.find_by({}, sort=[("foo.count", 1)])
+        results = list(result)
         assert 2 == len(results)
         assert results[0].foo is not None
         assert results[1].foo is not None
@@ -182,80 +323,223 @@ class TestRepository:
         result = spam_repository.find_by(
             {}, skip=10, limit=10, sort=[("foo.count", 1), ("id", 1)]
         )
-        results = [x for x in result]
+        results = list(result)
         assert 0 == len(results)
 
-    def test_invalid_model_id_field(self, database):
-        class NoIdModel(BaseModel):
-            something: str
+    def test_find_by_batch_size(self, spam_repository, mocker):
+        find_spy = mocker.spy(spam_repository.get_collection(), "find")
+
+        list(spam_repository.find_by({}, limit=10))
+        assert 10 == find_spy.call_args.kwargs["batch_size"]
+
+        list(spam_repository.find_by({}, limit=10, batch_size=2))
+        assert 2 == find_spy.call_args.kwargs["batch_size"]
+
+        list(spam_repository.paginate({}, limit=10, batch_size=3))
+        assert 3 == find_spy.call_args.kwargs["batch_size"]
+
+        # A page is fetched in a single batch, unbounded queries are capped
+        list(spam_repository.paginate({}, limit=5))
+        assert 5 == find_spy.call_args.kwargs["batch_size"]
+
+        list(spam_repository.find_by({}))
+        assert MAX_BATCH_SIZE == find_spy.call_args.kwargs["batch_size"]
+
+        list(spam_repository.find_by({}, limit=-3))
+        assert 3 == find_spy.call_args.kwargs["batch_size"]
+
+    def test_find_by_with_output_type(self, database, spam_repository):
+        class CountOnly(BaseModel):
+            foo: Foo
 
-        class BrokenRepository(AbstractRepository[NoIdModel]):
-            class Meta:
-                collection_name = "spams"
+        database.spams.insert_one({"foo": {"count": 2, "size": 1.0}})
 
-        with pytest.raises(Exception):
-            BrokenRepository(database=database)
+        result = spam_repository.find_by_with_output_type(
+            CountOnly, {}, projection={"id": 0, "foo": 1}
+        )
+        results = list(result)
+        assert 1 == len(results)
+        assert 2 == results[0].foo.count
+
+    def test_to_model_custom(self, spam_repository):
+        document = {"_id": SPAM_ID, "foo": {"count": 1}}
+
+        result = spam_repository.to_model_custom(Spam, document)
+
+        assert SPAM_ID == result.id
+        assert "_id" in document, "should not mutate the input document"
+
+    def test_to_model(self, spam_repository):
+        document = {"_id": SPAM_ID, "foo": {"count": 1}}
+
+        result = spam_repository.to_model(document)
+
+        assert isinstance(result, Spam)
+        assert SPAM_ID == result.id
+        assert "_id" in document, "should not mutate the input document"
+
+    def test_find_with_to_model_overrides(self, database):
+        class TaggedSpam(Spam):
+            tagged: bool = False
 
-    def test_invalid_model_collection_name(self, database):
-        class BrokenRepository(AbstractRepository[Spam]):
-            class Meta:
-                collection_name = None
+        class CustomSpamRepository(SpamRepository):
+            def to_model_custom(self, output_type, data):
+                return TaggedSpam(
+                    **super().to_model_custom(output_type, data).model_dump(),
+                    tagged=True
+                )
 
-        with pytest.raises(Exception):
-            BrokenRepository(database=database)
+        database.spams.insert_one({"_id": SPAM_ID, "foo": {"count": 1}})
+        spam_repository = CustomSpamRepository(database=database)
 
-    def test_paginate(self, database):
+        assert cast(TaggedSpam, spam_repository.find_one_by_id(SPAM_ID)).tagged
+        assert all(
+            cast(TaggedSpam, spam).tagged for spam in spam_repository.find_by({})
+        )
+
+        class CustomModelSpamRepository(SpamRepository):
+            def to_model(self, data):
+                return TaggedSpam(**super().to_model(data).model_dump(), tagged=True)
+
+        model_repository = CustomModelSpamRepository(database=database)
+
+        assert cast(TaggedSpam, model_repository.find_one_by({"id": SPAM_ID})).tagged
+
+    @pytest.mark.parametrize(
+        "repository_class, message",
+        [
+            (NoIdRepository, "Document class should have id field"),
+            (NoCollectionNameRepository, "Meta should contain collection name"),
+        ],
+    )
+    def test_invalid_repository(self, database, repository_class, message):
+        with pytest.raises(Exception, match=message):
+            repository_class(database=database)
+
+    def test_paginate(self, database, spam_repository):
         database.spams.insert_many(
             [
                 {
-                    "_id": ObjectId("611b140f4eb6ee47e966860f"),
+                    "_id": PAGINATED_SPAM_IDS[0],
                     "foo": {"count": 2, "size": 1.0},
                     "bars": [{"apple": "x", "banana": "y"}],
                 },
                 {
-                    "id": ObjectId("611b141cf533ca420b7580d6"),
+                    "id": PAGINATED_SPAM_IDS[1],
                     "foo": {"count": 3, "size": 1.0},
                     "bars": [{"apple": "x", "banana": "y"}],
                 },
                 {
-                    "_id": ObjectId("611b15241dea2ee3f7cbfe30"),
+                    "_id": PAGINATED_SPAM_IDS[2],
                     "foo": {"count": 2, "size": 1.0},
                     "bars": [{"apple": "x", "banana": "y"}],
                 },
                 {
-                    "_id": ObjectId("611b157c859bde7de88c98ac"),
+                    "_id": PAGINATED_SPAM_IDS[3],
                     "foo": {"count": 2, "size": 1.0},
                     "bars": [{"apple": "x", "banana": "y"}],
                 },
                 {
-                    "_id": ObjectId("611b158adec89d18984b7d90"),
+                    "_id": PAGINATED_SPAM_IDS[4],
                     "foo": {"count": 2, "size": 1.0},
                     "bars": [{"apple": "x", "banana": "y"}],
                 },
-            ]
+            ],
+            ordered=False,
         )
 
-        spam_repository = SpamRepository(database=database)
-
         # Simple Find
         result = list(spam_repository.paginate({}, limit=10))
         assert len(result) == 5
 
         # Find After
         result = list(
-            spam_repository.paginate(
-                {}, limit=10, after="eNqTYWBgYCljEAFS7AYMidKiXfdOzJWY4V07gYEBAD7HBkg="
-            )
+            spam_repository.paginate({}, limit=10, after=PAGINATION_CURSOR)
         )
         assert len(result) == 1
 
         # Find Before
         result = list(
-            spam_repository.paginate(
-                {}, limit=10, before="eNqTYWBgYCljEAFS7AYMidKiXfdOzJWY4V07gYEBAD7HBkg="
-            )
+            spam_repository.paginate({}, limit=10, before=PAGINATION_CURSOR)
         )
         assert len(result) == 3
 
         with pytest.raises(PaginationError):
             spam_repository.paginate({}, limit=10, after="invalid string")
+
+    def test_get_pagination_query(self, spam_repository):
+        spam_id = PAGINATED_SPAM_IDS[4]
+        sort = [("_id", 1)]
+
+        assert {"foo.count": 1} == spam_repository.get_pagination_query(
+            {"foo.count": 1}, sort=sort
+        )
+        assert {
+            "_id": {"$gt": spam_id},
+            "foo.count": 1,
+        } == spam_repository.get_pagination_query(
+            {"foo.count": 1}, after=PAGINATION_CURSOR, sort=sort
+        )
+        assert {
+            "$and": [{"_id": {"$lt": spam_id}}, {"_id": {"$ne": spam_id}}]
+        } == spam_repository.get_pagination_query(
+            {"_id": {"$ne": spam_id}}, before=PAGINATION_CURSOR, sort=sort
+        )
+
+        with pytest.raises(PaginationError):
+            spam_repository.get_pagination_query(
+                {}, after=PAGINATION_CURSOR, sort=[("foo.count", 1), ("_id", 1)]
+            )
+
+    def test_paginate_with_returned_cursor(self, spam_repository):
+        spams = [Spam() for _ in range(5)]
+        spam_repository.save_many(spams)
+
+        first_page = list(spam_repository.paginate({}, limit=2))
+        second_page = list(
+            spam_repository.paginate({}, limit=10, after=first_page[-1].cursor)
+        )
+
+        assert [spam.id for spam in spams[2:]] == [edge.node.id for edge in second_page]
+
+    def test_paginate_by_object_id_field(self, database):
+        ham_repository = HamRepository(database=database)
+        ham_repository.save_many(
+            [
+                Ham(owner=owner_id, position=position)
+                for position, owner_id in enumerate(PAGINATED_SPAM_IDS[:4])
+            ]
+        )
+        sort = [("owner", 1)]
+
+        first_page = ham_repository.paginate({}, limit=2, sort=sort)
+        second_page = ham_repository.paginate(
+            {}, limit=2, after=first_page[-1].cursor, sort=sort
+        )
+
+        assert [0, 1] == [edge.node.position for edge in first_page]
+        assert [2, 3] == [edge.node.position for edge in second_page]
+
+    def test_paginate_with_id_query(self, spam_repository):
+        spams = [Spam() for _ in range(3)]
+        spam_repository.save_many(spams)
+        query = {"id": {"$in": [spam.id for spam in spams]}}
+
+        first_page = spam_repository.paginate(query, limit=2)
+        second_page = spam_repository.paginate(
+            query, limit=2, after=first_page[-1].cursor
+        )
+        last_page = spam_repository.paginate(
+            query, limit=2, after=second_page[-1].cursor
+        )
+
+        assert [spams[2].id] == [edge.node.id for edge in second_page]
+        assert [] == last_page
+        assert {
+            "$and": [
+                {"_id": {"$gt": spams[1].id}},
+                {"_id": {"$in": query["id"]["$in"]}},
+            ]
+        } == spam_repository.get_pagination_query(
+            query, after=first_page[-1].cursor, sort=[("id", 1)]
+        )